@@ -1,16 +1,55 @@
 import streamlit as st
-import pandas as pd
-import plotly.express as px
+import numpy as np
+import plotly.graph_objects as go
 import psutil
 import platform
 import socket
 import os
-from datetime import datetime
-from typing import Dict, Any
+import threading
+import time
+from collections import namedtuple
+from types import MappingProxyType
+from typing import Dict, Any, Callable, Mapping, Optional, Tuple
 
 # Constants
 GRID_EMISSION_FACTOR = 400  # gCO2/kWh (US average)
 PUE_CLOUD = 1.2  # Power Usage Effectiveness for cloud data centers
+CPU_WATTS_COEF = 15 / 100 / 1000  # W per (% utilisation x MHz), i.e. 15W at 100% of 1GHz
+DEFAULT_CPU_FREQ_MHZ = 2500  # assumed clock when cpu_freq is unavailable
+PSUTIL_CPU_FREQ = getattr(psutil, "cpu_freq", None)  # missing on some platforms, resolved once
+HOURLY_CO2_PER_WATT = GRID_EMISSION_FACTOR / 1000  # gCO2/h per W drawn
+DAILY_KG_PER_HOURLY_G = 24 / 1000  # gCO2/h -> kgCO2/day
+ANNUAL_T_PER_HOURLY_G = 24 * 365 / 1000000  # gCO2/h -> tCO2/year
+SAMPLE_INTERVAL = 1  # seconds between background metric samples
+REFRESH_INTERVALS = {"2s": 2, "5s": 5, "30s": 30, "1m": 60}  # live refresh choices (seconds)
+DEFAULT_REFRESH = "5s"
+CPU_FREQ_CACHE_TTL = 30  # seconds between cpu_freq reads (one sysfs file per core)
+MEMORY_CACHE_TTL = 0.5  # minimum seconds between virtual_memory reads
+MEMORY_MAX_INTERVAL = 5  # longest memory read interval while usage is stable
+DISK_CACHE_TTL = 30  # minimum seconds between disk_usage reads (changes slowly)
+DISK_MAX_INTERVAL = 300  # longest disk read interval while usage is stable
+STABLE_CHANGE_THRESHOLD = 1.0  # percentage points of smoothed change counted as stable
+HISTORY_SECONDS = 600  # time span kept for the anomaly baseline and power trend
+HISTORY_LENGTH = int(HISTORY_SECONDS / SAMPLE_INTERVAL)  # samples in the history ring buffer
+HISTORY_DTYPE = np.dtype([  # one ring-buffer record per reading
+    ('timestamp', 'i8'),  # epoch seconds, formatted only when plotted
+    ('cpu_usage', 'f4'), ('memory_percent', 'f4'), ('disk_percent', 'f4'),
+    ('cpu_power', 'f4'), ('mem_power', 'f4'), ('disk_power', 'f4'), ('total_power', 'f4')
+])
+ANOMALY_MIN_READINGS = 10  # readings required before anomaly detection starts
+ANOMALY_FACTOR = 1.3  # flag power 30% above the recent average
+MAX_TREND_POINTS = 400  # longer histories are LTTB-downsampled before plotting
+CONTAINER_CGROUP_MARKERS = (b"docker", b"kubepods", b"containerd")  # seen in /proc/1/cgroup
+CGROUP_MEMORY_FILES = (  # (usage, limit, stat, reclaimable page-cache key in stat)
+    ("/sys/fs/cgroup/memory.current", "/sys/fs/cgroup/memory.max",
+     "/sys/fs/cgroup/memory.stat", "inactive_file"),  # cgroup v2
+    ("/sys/fs/cgroup/memory/memory.usage_in_bytes", "/sys/fs/cgroup/memory/memory.limit_in_bytes",
+     "/sys/fs/cgroup/memory/memory.stat", "total_inactive_file")  # v1
+)
+METRICS_EXPORTER_PORT_ENV = os.environ.get("METRICS_EXPORTER_PORT", "").strip()
+METRICS_EXPORTER_PORT = (  # Prometheus port; 0 (unset, empty or invalid) disables the exporter
+    int(METRICS_EXPORTER_PORT_ENV) if METRICS_EXPORTER_PORT_ENV.isdigit() else 0
+)
 
 # Page configuration
 st.set_page_config(
@@ -19,8 +58,8 @@ st.set_page_config(
     layout="wide"
 )
 
-# Custom CSS
-st.markdown("""
+# Custom CSS (st.html skips the markdown parser for pure HTML)
+st.html("""
 <style>
     .metric-card {
         background-color: #0e1117;
@@ -41,72 +80,245 @@ st.markdown("""
         margin: 10px 0;
     }
 </style>
-""", unsafe_allow_html=True)
+""")
+
+# HTML card templates, filled with str.format_map and rendered with st.html
+CLOUD_ENV_CARD_HTML = """
+<div class="alert-card">
+    <h3>🛠️ Running in Cloud Environment</h3>
+    <p>Some hardware metrics may be limited due to cloud virtualization</p>
+</div>
+"""
+POWER_CARD_HTML = """
+<div class="power-card">
+    <h4>Power Consumption</h4>
+    <p>CPU: {cpu}W | Memory: {memory}W | Disk: {disk}W</p>
+    <p>Total IT Load: {total_it}W | Facility Power: {total_facility}W (PUE: {pue})</p>
+</div>
+"""
+EMISSIONS_CARD_HTML = """
+<div class="power-card">
+    <h4>Carbon Emissions</h4>
+    <p>Current: {hourly}g CO₂/hour</p>
+    <p>Estimated Daily: {daily}kg | Annual: {annual} metric tons</p>
+</div>
+"""
+ANOMALY_CARD_HTML = """
+<div class="alert-card">
+    <h4>⚠️ Power Anomaly Detected</h4>
+    <p>Current: {current:.1f}W (Avg: {avg:.1f}W)</p>
+    <p>Potential inefficiency or workload spike detected</p>
+</div>
+"""
+
+class AdaptiveSampler:
+    """Reuse a metric's last reading, re-reading less often while it stays stable"""
+    
+    def __init__(self, threshold: float = STABLE_CHANGE_THRESHOLD):
+        self.threshold = threshold
+        # Normally only the metrics-sampler thread reads through here, but after a cache
+        # clear the outgoing thread's last sample can overlap the new sampler's first one
+        self._lock = threading.Lock()
+        self._state = {}  # key -> (value, ema_change, interval, next_sample_time)
+    
+    def sample(self, key: str, read: Callable[[], Any], min_interval: float,
+               max_interval: float) -> Any:
+        """Return the cached value for key, calling read() once its interval has elapsed
+        
+        read() must return a psutil result with a ``percent`` field. The interval doubles
+        (up to max_interval) while the smoothed change stays below the threshold and
+        drops back to min_interval as soon as the metric moves.
+        """
+        now = time.monotonic()
+        with self._lock:
+            state = self._state.get(key)
+            if state and now < state[3]:
+                return state[0]
+            
+            value = read()
+            if state:
+                ema_change = 0.5 * state[1] + 0.5 * abs(value.percent - state[0].percent)
+                stable = ema_change < self.threshold
+                interval = min(state[2] * 2, max_interval) if stable else min_interval
+            else:
+                ema_change, interval = 0.0, min_interval
+            
+            self._state[key] = (value, ema_change, interval, now + interval)
+            return value
+
+@st.cache_resource(show_spinner=False)
+def get_sampler() -> AdaptiveSampler:
+    """Adaptive read cache for the metrics-sampler thread (one per process)"""
+    return AdaptiveSampler()
+
+# Same fields as psutil.virtual_memory() that the dashboard reads
+CgroupMemory = namedtuple("CgroupMemory", ["total", "used", "percent"])
+
+@st.cache_resource(show_spinner=False)
+def find_cgroup_memory_limit() -> Optional[Tuple[str, str, str, int]]:
+    """Locate the container's memory usage and stat files and its limit
+    
+    Returns None when memory is unlimited or the limit can't be read, so callers
+    fall back to psutil.
+    """
+    host_total = psutil.virtual_memory().total
+    for usage_path, limit_path, stat_path, cache_key in CGROUP_MEMORY_FILES:
+        try:
+            with open(limit_path) as f:
+                raw_limit = f.read().strip()
+            # v2 writes "max" and v1 a huge sentinel when no limit is set
+            if raw_limit == "max" or int(raw_limit) >= host_total:
+                return None
+        except (OSError, ValueError):
+            continue
+        return usage_path, stat_path, cache_key, int(raw_limit)
+    return None
+
+def read_cgroup_memory(usage_path: str, stat_path: str, cache_key: str, limit: int) -> CgroupMemory:
+    """Read the container's memory usage against its cgroup limit
+    
+    The usage file counts page cache, so reclaimable inactive file pages are
+    subtracted (as docker stats and the kubelet do) to match psutil's ``used``.
+    """
+    with open(usage_path) as f:
+        used = int(f.read())
+    with open(stat_path) as f:
+        for line in f:
+            key, _, value = line.partition(" ")
+            if key == cache_key:
+                used = max(used - int(value), 0)
+                break
+    return CgroupMemory(total=limit, used=used, percent=round(used / limit * 100, 1))
+
+def read_virtual_memory():
+    """Read memory usage, backing off between MEMORY_CACHE_TTL and MEMORY_MAX_INTERVAL
+    
+    Inside a memory-limited container this reports usage against the cgroup limit
+    rather than the host's /proc/meminfo view.
+    """
+    cgroup = None
+    if SystemMonitor.detect_environment()["containerized"]:
+        cgroup = find_cgroup_memory_limit()
+    read = (lambda: read_cgroup_memory(*cgroup)) if cgroup else psutil.virtual_memory
+    return get_sampler().sample("memory", read, MEMORY_CACHE_TTL, MEMORY_MAX_INTERVAL)
+
+def read_disk_usage(path: str = '/'):
+    """Read disk usage for a mount point, backing off between DISK_CACHE_TTL and DISK_MAX_INTERVAL"""
+    return get_sampler().sample(
+        f"disk:{path}", lambda: psutil.disk_usage(path), DISK_CACHE_TTL, DISK_MAX_INTERVAL
+    )
+
+@st.cache_data(ttl=CPU_FREQ_CACHE_TTL, show_spinner=False)
+def read_cpu_freq() -> Optional[float]:
+    """Read the current CPU clock in MHz, re-reading at most every CPU_FREQ_CACHE_TTL"""
+    if PSUTIL_CPU_FREQ is None:
+        return None
+    freq = PSUTIL_CPU_FREQ()
+    return freq.current if freq else None
+
+# HTTP server and the gauges it serves, keyed by metric name
+MetricsExporter = namedtuple("MetricsExporter", ["server", "gauges"])
+
+def stop_metrics_exporter(exporter: MetricsExporter) -> None:
+    """Shut down the exporter's HTTP server and free its port"""
+    exporter.server.shutdown()
+    exporter.server.server_close()
+
+@st.cache_resource(show_spinner=False, on_release=stop_metrics_exporter)
+def start_metrics_exporter(port: int) -> MetricsExporter:
+    """Serve Prometheus gauges on the given port (started once per process)"""
+    from prometheus_client import CollectorRegistry, Gauge, start_http_server
+    
+    # A private registry keeps a failed bind or a cache clear from leaving
+    # duplicate gauges behind in prometheus_client's global REGISTRY
+    registry = CollectorRegistry()
+    server, _ = start_http_server(port, registry=registry)
+    return MetricsExporter(server, {
+        "cpu_usage": Gauge("system_cpu_percent", "CPU utilisation (%)", registry=registry),
+        "memory_percent": Gauge("system_memory_percent", "Memory utilisation (%)", registry=registry),
+        "disk_percent": Gauge("system_disk_percent", "Disk utilisation (%)", registry=registry),
+        "total_it": Gauge("system_it_power_watts", "Estimated IT power draw (W)", registry=registry),
+        "total_facility": Gauge(
+            "system_facility_power_watts", "Estimated facility power draw (W)", registry=registry
+        )
+    })
+
+def export_metrics(metrics: Dict[str, Any], power: Dict[str, Any]) -> None:
+    """Publish the latest readings to the Prometheus exporter when it is enabled"""
+    if not METRICS_EXPORTER_PORT:
+        return
+        
+    gauges = start_metrics_exporter(METRICS_EXPORTER_PORT).gauges
+    for name in ("cpu_usage", "memory_percent", "disk_percent"):
+        gauges[name].set(metrics[name])
+    for name in ("total_it", "total_facility"):
+        gauges[name].set(power[name])
 
 class SystemMonitor:
     """Comprehensive system monitoring with energy analytics"""
     
     @staticmethod
-    def detect_environment() -> Dict[str, Any]:
-        """Detect if running in cloud environment"""
-        return {
+    @st.cache_resource(show_spinner=False)
+    def detect_environment() -> Mapping[str, Any]:
+        """Detect if running in cloud environment (fixed for the process lifetime)
+        
+        The result is shared by every session, so it is returned read-only.
+        """
+        try:
+            with open("/proc/1/cgroup", "rb") as f:
+                init_cgroup = f.read()
+        except OSError:
+            init_cgroup = b""
+        
+        return MappingProxyType({
             "is_streamlit_cloud": "STREAMLIT_SERVER_ADDRESS" in os.environ,
             "platform": platform.system(),
-            "containerized": os.path.exists("/.dockerenv")
-        }
+            "containerized": os.path.exists("/.dockerenv") or any(
+                marker in init_cgroup for marker in CONTAINER_CGROUP_MARKERS
+            )
+        })
 
     @staticmethod
     def get_system_metrics() -> Dict[str, Any]:
         """Get all system metrics in a cloud-friendly way"""
-        try:
-            cpu_freq = psutil.cpu_freq().current if hasattr(psutil, "cpu_freq") else None
-            mem = psutil.virtual_memory()
-            disk = psutil.disk_usage('/')
-            net_io = psutil.net_io_counters()
-            
-            return {
-                "timestamp": datetime.now().strftime("%H:%M:%S"),
-                "cpu_usage": psutil.cpu_percent(interval=1),
-                "cpu_freq": cpu_freq,
-                "memory_used": mem.used / (1024 ** 3),
-                "memory_total": mem.total / (1024 ** 3),
-                "memory_percent": mem.percent,
-                "disk_used": disk.used / (1024 ** 3),
-                "disk_total": disk.total / (1024 ** 3),
-                "disk_percent": disk.percent,
-                "network_sent": net_io.bytes_sent / (1024 ** 2),
-                "network_recv": net_io.bytes_recv / (1024 ** 2)
-            }
-        except Exception as e:
-            st.error(f"Metrics collection error: {str(e)}")
-            return None
+        cpu_freq = read_cpu_freq()
+        mem = read_virtual_memory()
+        disk = read_disk_usage('/')
+        net_io = psutil.net_io_counters()
+        
+        return {
+            "timestamp": int(time.time()),
+            "cpu_usage": psutil.cpu_percent(interval=None),  # since the previous sample
+            "cpu_freq": cpu_freq,
+            "memory_used": mem.used / (1024 ** 3),
+            "memory_total": mem.total / (1024 ** 3),
+            "memory_percent": mem.percent,
+            "disk_used": disk.used / (1024 ** 3),
+            "disk_total": disk.total / (1024 ** 3),
+            "disk_percent": disk.percent,
+            "network_sent": net_io.bytes_sent / (1024 ** 2),
+            "network_recv": net_io.bytes_recv / (1024 ** 2)
+        }
 
     @staticmethod
     def calculate_power(metrics: Dict[str, Any]) -> Dict[str, Any]:
         """Calculate power usage from metrics"""
-        if not metrics:
-            return None
-            
-        try:
-            # Dynamic power estimation
-            cpu_power = (metrics["cpu_usage"]/100) * (metrics["cpu_freq"]/1000 if metrics["cpu_freq"] else 2.5) * 15
-            mem_power = metrics["memory_used"] * 0.3  # 0.3W per GB
-            disk_power = 5 if metrics["disk_percent"] > 50 else 2
-            
-            total_it_power = cpu_power + mem_power + disk_power
-            total_power = total_it_power * PUE_CLOUD
-            
-            return {
-                "cpu": round(cpu_power, 1),
-                "memory": round(mem_power, 1),
-                "disk": round(disk_power, 1),
-                "total_it": round(total_it_power, 1),
-                "total_facility": round(total_power, 1),
-                "pue": PUE_CLOUD
-            }
-        except Exception as e:
-            st.error(f"Power calculation error: {str(e)}")
-            return None
+        # Dynamic power estimation
+        cpu_power = metrics["cpu_usage"] * (metrics["cpu_freq"] or DEFAULT_CPU_FREQ_MHZ) * CPU_WATTS_COEF
+        mem_power = metrics["memory_used"] * 0.3  # 0.3W per GB
+        disk_power = 5 if metrics["disk_percent"] > 50 else 2
+        
+        total_it_power = cpu_power + mem_power + disk_power
+        total_power = total_it_power * PUE_CLOUD
+        
+        return {
+            "cpu": round(cpu_power, 1),
+            "memory": round(mem_power, 1),
+            "disk": round(disk_power, 1),
+            "total_it": round(total_it_power, 1),
+            "total_facility": round(total_power, 1),
+            "pue": PUE_CLOUD
+        }
 
     @staticmethod
     def calculate_emissions(power_w: float) -> Dict[str, Any]:
@@ -115,60 +327,203 @@ class SystemMonitor:
             return None
             
         try:
-            hourly_co2 = (power_w / 1000) * GRID_EMISSION_FACTOR
+            hourly_co2 = power_w * HOURLY_CO2_PER_WATT
             return {
                 "hourly": round(hourly_co2, 1),
-                "daily": round(hourly_co2 * 24 / 1000, 2),
-                "annual": round(hourly_co2 * 24 * 365 / 1000000, 3)
+                "daily": round(hourly_co2 * DAILY_KG_PER_HOURLY_G, 2),
+                "annual": round(hourly_co2 * ANNUAL_T_PER_HOURLY_G, 3)
             }
         except Exception as e:
             st.error(f"Emission calculation error: {str(e)}")
             return None
 
-def create_gauge(value: float, title: str, color: str) -> px.pie:
-    """Create a gauge chart for metrics visualization"""
-    fig = px.pie(
-        values=[value, 100-value],
-        names=['Used', 'Free'],
-        hole=0.7,
-        title=f"{title}: {value}%"
-    )
-    fig.update_traces(
-        textinfo='none',
-        marker=dict(colors=[color, '#333333'])
-    )
-    fig.update_layout(
-        showlegend=False,
-        margin=dict(t=50, b=10, l=10, r=10),
-        height=200
-    )
+    @staticmethod
+    def detect_anomaly(current_power: float, avg_power: float) -> bool:
+        """Flag current power above ANOMALY_FACTOR times the recent average"""
+        return current_power > avg_power * ANOMALY_FACTOR
+
+class MetricsSampler:
+    """Collect metrics on a background thread into a process-wide history ring buffer
+    
+    Sampling runs every SAMPLE_INTERVAL however many sessions are open and whatever
+    their refresh interval; the dashboard fragment only reads the results.
+    """
+    
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        self.latest = None  # (metrics, power) of the newest sample
+        self.error = None  # message from the last failed sample
+        self._history = np.zeros(HISTORY_LENGTH, dtype=HISTORY_DTYPE)
+        self._head = 0  # total samples written so far
+        self._power_sum = 0.0  # running total of the buffered total_power values
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        
+        # Seed psutil's CPU counters and let one interval pass, so the first
+        # non-blocking cpu_percent read covers a real window instead of returning 0.0
+        psutil.cpu_percent(interval=None)
+        self._stop.wait(self.interval)
+        self.sample()
+        threading.Thread(target=self._run, name="metrics-sampler", daemon=True).start()
+    
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.sample()
+    
+    def stop(self) -> None:
+        """Stop the sampling thread after its current sample"""
+        self._stop.set()
+    
+    def sample(self) -> None:
+        """Collect one reading, append it to the history and publish it to the exporter
+        
+        st.error does nothing off the script thread, so collection and power
+        calculation let failures propagate here and the message is kept in self.error
+        for the dashboard to show.
+        """
+        try:
+            metrics = SystemMonitor.get_system_metrics()
+        except Exception as e:
+            self.error = f"Metrics collection error: {str(e)}"
+            return
+        
+        try:
+            power = SystemMonitor.calculate_power(metrics)
+        except Exception as e:
+            self.error = f"Power calculation error: {str(e)}"
+            return
+        
+        with self._lock:
+            slot = self._head % HISTORY_LENGTH
+            if self._head >= HISTORY_LENGTH:
+                self._power_sum -= float(self._history[slot]['total_power'])
+            self._history[slot] = (
+                metrics["timestamp"],
+                metrics["cpu_usage"],
+                metrics["memory_percent"],
+                metrics["disk_percent"],
+                power["cpu"],
+                power["memory"],
+                power["disk"],
+                power["total_facility"]
+            )
+            self._power_sum += float(self._history[slot]['total_power'])
+            self._head += 1
+            self.latest = (metrics, power)
+        
+        try:
+            export_metrics(metrics, power)
+            self.error = None
+        except Exception as e:
+            self.error = f"Metrics export error: {str(e)}"
+    
+    @property
+    def sample_count(self) -> int:
+        """Total samples recorded since the sampler started"""
+        return self._head
+    
+    def average_power(self) -> float:
+        """Mean facility power over the buffered samples, maintained in O(1) per sample"""
+        with self._lock:
+            return self._power_sum / min(self._head, HISTORY_LENGTH) if self._head else 0.0
+    
+    def history(self) -> np.ndarray:
+        """Return a copy of the recorded samples, oldest first"""
+        with self._lock:
+            if self._head <= HISTORY_LENGTH:
+                return self._history[:self._head].copy()
+            return np.roll(self._history, -(self._head % HISTORY_LENGTH))
+
+@st.cache_resource(show_spinner=False, on_release=MetricsSampler.stop)
+def start_metrics_sampler() -> MetricsSampler:
+    """Start the background sampler shared by every session
+    
+    Clearing the resource cache stops the old thread before a new sampler starts.
+    """
+    return MetricsSampler()
+
+def create_gauge(value: float, title: str, color: str) -> go.Figure:
+    """Create a gauge chart for metrics visualization, reusing the session's figure"""
+    if 'gauge_figures' not in st.session_state:
+        st.session_state.gauge_figures = {}
+    
+    fig = st.session_state.gauge_figures.get(title)
+    if fig is None:
+        fig = go.Figure(go.Indicator(
+            mode='gauge+number',
+            title={'text': title},
+            number={'suffix': '%'},
+            gauge={
+                'axis': {'range': [0, 100]},
+                'bar': {'color': color},
+                'bgcolor': '#333333'
+            }
+        ))
+        fig.update_layout(
+            margin=dict(t=50, b=10, l=10, r=10),
+            height=200
+        )
+        st.session_state.gauge_figures[title] = fig
+    
+    fig.data[0].value = value
     return fig
 
-def main():
-    """Main application function"""
-    monitor = SystemMonitor()
-    env = monitor.detect_environment()
+def lttb_indices(values: np.ndarray, n_out: int) -> np.ndarray:
+    """Pick n_out indices with Largest-Triangle-Three-Buckets, preserving the series' shape
     
-    st.title("🌐 Cloud/Server Energy Monitoring Dashboard")
+    Readings are evenly spaced, so the sample index stands in for the x coordinate.
+    """
+    n = len(values)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
     
-    # Environment awareness
-    if env["is_streamlit_cloud"]:
-        st.markdown("""
-        <div class="alert-card">
-            <h3>🛠️ Running in Cloud Environment</h3>
-            <p>Some hardware metrics may be limited due to cloud virtualization</p>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    # Initialize session state for metrics history
-    if 'metrics_history' not in st.session_state:
-        st.session_state.metrics_history = pd.DataFrame(columns=[
-            'timestamp', 'cpu_usage', 'memory_percent', 'disk_percent',
-            'cpu_power', 'mem_power', 'disk_power', 'total_power'
-        ])
-    
-    # Get current metrics
-    metrics = monitor.get_system_metrics()
+    indices = np.empty(n_out, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    next_edges = np.append(edges[2:], n)
+    
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        avg_x = (end + next_edges[i] - 1) / 2
+        avg_y = values[end:next_edges[i]].mean()
+        
+        xs = np.arange(start, end)
+        areas = np.abs((a - avg_x) * (values[start:end] - values[a]) - (a - xs) * (avg_y - values[a]))
+        a = start + int(np.argmax(areas))
+        indices[i + 1] = a
+    return indices
+
+def create_power_trend(times: np.ndarray, total_power: np.ndarray) -> go.Figure:
+    """Create the power trend line chart, reusing the session's figure"""
+    fig = st.session_state.get('power_trend_figure')
+    if fig is None:
+        fig = go.Figure(go.Scattergl(mode='lines', line=dict(color='#636efa')))
+        fig.update_layout(
+            xaxis_title='timestamp',
+            xaxis_type='date',  # LTTB keeps uneven indices, so x must be real time
+            xaxis_tickformat='%H:%M:%S',
+            yaxis_title='Total Power (W)'
+        )
+        st.session_state.power_trend_figure = fig
+    
+    if len(total_power) > MAX_TREND_POINTS:
+        keep = lttb_indices(total_power, MAX_TREND_POINTS)
+        times, total_power = times[keep], total_power[keep]
+    
+    fig.data[0].x = [time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(t)) for t in times.tolist()]
+    fig.data[0].y = total_power
+    return fig
+
+def render_live_metrics():
+    """Render the live gauges and power analytics; main() runs this as an auto-refreshing fragment"""
+    monitor = SystemMonitor()
+    sampler = start_metrics_sampler()
+    
+    # Latest background sample
+    if sampler.error:
+        st.error(sampler.error)
+    metrics, power = sampler.latest or (None, None)
     
     # Layout columns
     col1, col2 = st.columns([1, 2])
@@ -180,107 +535,102 @@ def main():
             # Resource usage gauges
             st.plotly_chart(
                 create_gauge(metrics["cpu_usage"], "CPU", "#1f77b4"),
-                use_container_width=True
+                key="cpu_gauge",
+                width="stretch"
             )
             
             st.plotly_chart(
                 create_gauge(metrics["memory_percent"], "Memory", "#ff7f0e"),
-                use_container_width=True
+                key="memory_gauge",
+                width="stretch"
             )
             
             st.plotly_chart(
                 create_gauge(metrics["disk_percent"], "Disk", "#2ca02c"),
-                use_container_width=True
+                key="disk_gauge",
+                width="stretch"
             )
             
-            # Network activity
-            st.markdown("#### Network Activity")
-            net_df = pd.DataFrame({
-                "Direction": ["Sent", "Received"],
-                "MB": [metrics["network_sent"], metrics["network_recv"]]
-            })
-            st.bar_chart(net_df.set_index("Direction"))
+            # Network activity, relative to the first reading of this session
+            if 'net_baseline' not in st.session_state:
+                st.session_state.net_baseline = (metrics["network_sent"], metrics["network_recv"])
+            base_sent, base_recv = st.session_state.net_baseline
+            
+            st.markdown("#### Network Activity (since session start)")
+            st.bar_chart(
+                {
+                    "Direction": ["Sent", "Received"],
+                    "MB": [metrics["network_sent"] - base_sent, metrics["network_recv"] - base_recv]
+                },
+                x="Direction",
+                y="MB"
+            )
     
     with col2:
         st.markdown("### Power Analytics")
         
         if metrics:
-            power = monitor.calculate_power(metrics)
             emissions = monitor.calculate_emissions(power["total_facility"] if power else None)
             
             if power:
-                # Update metrics history
-                new_row = {
-                    'timestamp': metrics["timestamp"],
-                    'cpu_usage': metrics["cpu_usage"],
-                    'memory_percent': metrics["memory_percent"],
-                    'disk_percent': metrics["disk_percent"],
-                    'cpu_power': power["cpu"],
-                    'mem_power': power["memory"],
-                    'disk_power': power["disk"],
-                    'total_power': power["total_facility"]
-                }
-                
-                st.session_state.metrics_history = pd.concat([
-                    st.session_state.metrics_history,
-                    pd.DataFrame([new_row])
-                ]).tail(60)  # Keep last 60 readings
+                sample_count = sampler.sample_count
+                readings = min(sample_count, HISTORY_LENGTH)
                 
                 # Power metrics cards
-                st.markdown("""
-                <div class="power-card">
-                    <h4>Power Consumption</h4>
-                    <p>CPU: {cpu}W | Memory: {mem}W | Disk: {disk}W</p>
-                    <p>Total IT Load: {it}W | Facility Power: {fac}W (PUE: {pue})</p>
-                </div>
-                """.format(
-                    cpu=power["cpu"],
-                    mem=power["memory"],
-                    disk=power["disk"],
-                    it=power["total_it"],
-                    fac=power["total_facility"],
-                    pue=power["pue"]
-                ), unsafe_allow_html=True)
+                st.html(POWER_CARD_HTML.format_map(power))
                 
                 # Emissions card
                 if emissions:
-                    st.markdown("""
-                    <div class="power-card">
-                        <h4>Carbon Emissions</h4>
-                        <p>Current: {hourly}g CO₂/hour</p>
-                        <p>Estimated Daily: {daily}kg | Annual: {annual} metric tons</p>
-                    </div>
-                    """.format(
-                        hourly=emissions["hourly"],
-                        daily=emissions["daily"],
-                        annual=emissions["annual"]
-                    ), unsafe_allow_html=True)
+                    st.html(EMISSIONS_CARD_HTML.format_map(emissions))
                 
                 # Anomaly detection
-                if len(st.session_state.metrics_history) > 10:
-                    avg_power = st.session_state.metrics_history['total_power'].mean()
+                if readings > ANOMALY_MIN_READINGS:
                     current_power = power["total_facility"]
-                    threshold = avg_power * 1.3  # 30% above average
+                    avg_power = sampler.average_power()
                     
-                    if current_power > threshold:
-                        st.markdown("""
-                        <div class="alert-card">
-                            <h4>⚠️ Power Anomaly Detected</h4>
-                            <p>Current: {current:.1f}W (Avg: {avg:.1f}W)</p>
-                            <p>Potential inefficiency or workload spike detected</p>
-                        </div>
-                        """.format(current=current_power, avg=avg_power), unsafe_allow_html=True)
+                    if monitor.detect_anomaly(current_power, avg_power):
+                        st.html(ANOMALY_CARD_HTML.format(current=current_power, avg=avg_power))
                 
                 # Power trend visualization
-                if len(st.session_state.metrics_history) > 1:
-                    st.markdown("#### Power Trend (Last 60 Readings)")
-                    fig = px.line(
-                        st.session_state.metrics_history,
-                        x='timestamp',
-                        y='total_power',
-                        labels={'total_power': 'Total Power (W)'}
+                if readings > 1:
+                    st.markdown(f"#### Power Trend (Last {HISTORY_SECONDS // 60} Minutes)")
+                    
+                    # Copy the history and rebuild the trace only when new samples arrived
+                    if st.session_state.get('trend_sample_count') != sample_count:
+                        history = sampler.history()
+                        create_power_trend(history['timestamp'], history['total_power'])
+                        st.session_state.trend_sample_count = sample_count
+                    
+                    st.plotly_chart(
+                        st.session_state.power_trend_figure,
+                        key="power_trend",
+                        width="stretch"
                     )
-                    st.plotly_chart(fig, use_container_width=True)
+
+def main():
+    """Main application function"""
+    monitor = SystemMonitor()
+    env = monitor.detect_environment()
+    
+    st.title("🌐 Cloud/Server Energy Monitoring Dashboard")
+    
+    # Environment awareness
+    if env["is_streamlit_cloud"]:
+        st.html(CLOUD_ENV_CARD_HTML)
+    
+    if METRICS_EXPORTER_PORT_ENV and not METRICS_EXPORTER_PORT_ENV.isdigit():
+        st.warning(
+            f"Ignoring invalid METRICS_EXPORTER_PORT={METRICS_EXPORTER_PORT_ENV!r}; "
+            "Prometheus export is disabled"
+        )
+    
+    # Only the live section reruns, at the user's chosen cadence
+    refresh = st.sidebar.selectbox(
+        "Refresh interval",
+        list(REFRESH_INTERVALS),
+        index=list(REFRESH_INTERVALS).index(DEFAULT_REFRESH)
+    )
+    st.fragment(render_live_metrics, run_every=REFRESH_INTERVALS[refresh])()
     
     # Cloud-specific notes
     if env["is_streamlit_cloud"]: